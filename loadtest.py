@@ -0,0 +1,285 @@
+"""Concurrent-session load test for usa.py.
+
+Starts ONE `streamlit run usa.py` server (a single replica) with yfinance, Bitkub,
+Google News RSS and the translator replaced by local stand-ins, then drives N
+concurrent sessions against it through search -> timeframe change -> Bitkub
+pair pick -> Calc. Each session is a websocket client speaking the browser's
+BackMsg/ForwardMsg protocol, run in its own client process so client-side
+parsing never competes with the server for a GIL.
+
+Latency is measured per rerun, from the rerun request to script_finished
+(including any st.rerun() follow-up). The server process's CPU and RSS are
+sampled from /proc (Linux) while each level runs; "RSS MB/sess" is the peak
+growth over the level's starting RSS divided by N.
+
+    python loadtest.py --sessions 1,5,10,20 --rounds 5 --latency-ms 50
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+import requests
+from websockets.sync.client import connect
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+SYMBOLS = ["GOOGL", "AAPL", "MSFT", "NVDA", "TSLA", "BTC-USD", "ETH-USD", "PTT.BK", "ZZTYPO"]
+TIMEFRAMES = ["1d", "1wk", "1h", "15m", "5m"]
+PERIOD_DAYS = {"1mo": 30, "3mo": 90, "6mo": 180, "1y": 365, "2y": 730, "5y": 1825, "10y": 3650, "max": 7300}
+INTERVAL_MIN = {"1d": 1440, "1wk": 10080, "1h": 60, "15m": 15, "5m": 5}
+MAX_BARS = 5000
+LATENCY = {"sec": 0.05}
+SAMPLE_SEC = 0.25
+START_DELAY_SEC = 3 # client processes import and connect first, then all start together
+
+
+# --- Upstream stand-ins (installed in the server process) ---
+def upstream_delay():
+    time.sleep(LATENCY["sec"] * random.uniform(0.5, 1.5))
+
+def fake_ohlc(symbol, period, interval):
+    if symbol.startswith("ZZ"): return pd.DataFrame()
+    n = min(MAX_BARS, max(30, PERIOD_DAYS.get(period, 180) * 1440 // INTERVAL_MIN.get(interval, 1440)))
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    spread = close * rng.uniform(0.002, 0.02, n)
+    idx = pd.date_range(end=pd.Timestamp.now(tz="America/New_York").floor("min"), periods=n, freq=f"{INTERVAL_MIN.get(interval, 1440)}min")
+    return pd.DataFrame({"Open": close + rng.normal(0, 0.3, n) * spread, "High": close + spread, "Low": close - spread,
+                         "Close": close, "Volume": rng.integers(1e5, 1e7, n).astype(float)}, index=idx)
+
+def fake_statements():
+    cols = pd.to_datetime(["2021-12-31", "2022-12-31", "2023-12-31", "2024-12-31"])
+    return pd.DataFrame([[100, 120, 150, 180], [10, 14, 20, 25], [15, 18, 24, 30]],
+                        index=["Total Revenue", "Net Income", "Operating Cash Flow"], columns=cols) * 1e9
+
+class FakeTicker:
+    def __init__(self, symbol, session=None): self.symbol = symbol
+    def history(self, period="1mo", interval="1d", **kw):
+        upstream_delay()
+        return fake_ohlc(self.symbol, period, interval)
+    @property
+    def info(self):
+        upstream_delay()
+        return {"sector": "Technology", "trailingPE": 24.0, "returnOnEquity": 0.2, "pegRatio": 1.4, "priceToBook": 5.0,
+                "profitMargins": 0.2, "revenueGrowth": 0.1, "longBusinessSummary": "A company. " * 40}
+    @property
+    def financials(self):
+        upstream_delay()
+        return fake_statements()
+    income_statement = cashflow = cash_flow = financials
+
+def fake_download(symbol, period="1mo", interval="1d", **kw):
+    upstream_delay()
+    return fake_ohlc(symbol, period, interval)
+
+class FakeResponse:
+    def __init__(self, content, status_code=200): self.content, self.status_code, self.headers = content, status_code, {"ETag": '"lt"'}
+    def json(self): return json.loads(self.content)
+
+BITKUB = {f"THB_{c}": {"last": p, "high24hr": p * 1.03, "low24hr": p * 0.97, "percentChange": 1.2, "quoteVolume": p * 1e3}
+          for c, p in [("BTC", 3.4e6), ("ETH", 1.2e5), ("XRP", 20.0), ("DOGE", 5.5), ("SOL", 6e3), ("ADA", 15.0)]}
+RSS = ("<?xml version='1.0'?><rss version='2.0'><channel><title>t</title>" + "".join(
+    f"<item><title>Market rallies on strong earnings {i}</title><link>https://example.com/n{i}</link>"
+    f"<description>Shares rose after results {i}.</description><pubDate>Mon, 06 Jan 2025 0{i}:00:00 GMT</pubDate></item>"
+    for i in range(8)) + "</channel></rss>").encode()
+
+def fake_session_get(self, url, headers=None, timeout=None, **kw):
+    upstream_delay()
+    if headers and headers.get("If-None-Match"): return FakeResponse(b"", 304)
+    if "bitkub" in url: return FakeResponse(json.dumps(BITKUB).encode())
+    if "news.google.com" in url: return FakeResponse(RSS)
+    return FakeResponse(b"", 404)
+
+class FakeTranslator:
+    def __init__(self, *a, **kw): pass
+    def translate(self, text):
+        upstream_delay()
+        return text
+
+def install_stand_ins():
+    import yfinance, nltk, deep_translator
+    yfinance.Ticker, yfinance.download = FakeTicker, fake_download
+    requests.Session.get = fake_session_get
+    deep_translator.GoogleTranslator = FakeTranslator
+    nltk.download = lambda *a, **kw: True
+    tmp = tempfile.mkdtemp(prefix="loadtest_") # keep the app's stores out of the repo
+    os.environ.update({"NEWS_DB_PATH": os.path.join(tmp, "news_store.db"), "PE_DB_PATH": os.path.join(tmp, "pe_universe.db"),
+                       "EXPORT_DIR": os.path.join(tmp, "exports")})
+    os.environ.pop("BITKUB_BAR_SPILL_DIR", None)
+
+def serve(app, port, latency_sec):
+    # The app script runs inside this process, so the patched modules are the ones it imports
+    LATENCY["sec"] = latency_sec
+    install_stand_ins()
+    from streamlit.web import cli as stcli
+    sys.argv = ["streamlit", "run", app, "--server.port", str(port), "--server.address", "127.0.0.1", "--server.headless", "true",
+                "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"]
+    sys.exit(stcli.main())
+
+def start_server(app, port, latency_sec, timeout):
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--app", app, "--port", str(port),
+                             "--latency-ms", str(latency_sec * 1000)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None: raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/_stcore/health", timeout=1).ok: return proc
+        except requests.RequestException: pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not become healthy")
+
+
+# --- Session flow (one websocket client = one browser tab) ---
+class Session:
+    def __init__(self, url, timeout):
+        self.ws = connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout)
+        self.timeout, self.states, self.widgets = timeout, {}, []
+
+    def widget(self, kind, label):
+        for k, proto in self.widgets:
+            if k == kind and proto.label == label: return proto
+        raise LookupError(f"{kind} {label!r} not found; rendered: {[p.label for _, p in self.widgets]}")
+
+    def set(self, kind, label, value):
+        ws = WidgetState(id=self.widget(kind, label).id, string_value=value)
+        self.states[ws.id] = ws
+
+    def run(self, latencies, click=None):
+        msg = BackMsg()
+        msg.rerun_script.widget_states.widgets.extend(list(self.states.values()))
+        if click: msg.rerun_script.widget_states.widgets.append(WidgetState(id=self.widget("button", click).id, trigger_value=True))
+        t0 = time.perf_counter()
+        self.ws.send(msg.SerializeToString())
+        widgets, error = [], None
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(self.ws.recv(timeout=self.timeout))
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and fwd.delta.HasField("new_element"):
+                el = fwd.delta.new_element
+                el_kind = el.WhichOneof("type")
+                if el_kind in ("text_input", "button", "selectbox"): widgets.append((el_kind, getattr(el, el_kind)))
+                elif el_kind == "exception" and error is None: error = el.exception.message
+            elif kind == "script_finished":
+                if fwd.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN: widgets = [] # st.rerun(): the follow-up run is part of this interaction
+                else: break
+        latencies.append(time.perf_counter() - t0)
+        self.widgets = widgets
+        if error: raise RuntimeError(error)
+
+    def close(self):
+        self.ws.close()
+
+def run_session(url, rounds, timeout, latencies):
+    s = Session(url, timeout)
+    try:
+        s.run(latencies)
+        for _ in range(rounds):
+            s.set("text_input", "Symbol", random.choice(SYMBOLS))
+            s.run(latencies, click="วิเคราะห์ ⚡") # search
+            s.set("selectbox", "Timeframe", random.choice(TIMEFRAMES))
+            s.run(latencies) # timeframe change
+            pairs = [p for k, p in s.widgets if k == "selectbox" and p.label == "เลือกเหรียญ (THB)"]
+            if pairs:
+                s.set("selectbox", "เลือกเหรียญ (THB)", random.choice(pairs[0].options))
+                s.run(latencies) # tab interaction (tab switches themselves are client-side, no rerun)
+            if any(k == "button" and p.label == "🧮 คำนวณเดี๋ยวนี้ (Calculate)" for k, p in s.widgets):
+                s.run(latencies, click="🧮 คำนวณเดี๋ยวนี้ (Calculate)") # Calc
+    finally: s.close()
+
+def client_process(job):
+    url, rounds, timeout, seed, start_at = job
+    random.seed(seed)
+    time.sleep(max(0, start_at - time.time()))
+    latencies, error = [], ""
+    try: run_session(url, rounds, timeout, latencies)
+    except Exception as e: error = repr(e)
+    return {"latencies": latencies, "error": error}
+
+
+# --- Server sampling ---
+def proc_cpu_rss(pid):
+    with open(f"/proc/{pid}/stat") as f: fields = f.read().rsplit(")", 1)[1].split()
+    with open(f"/proc/{pid}/status") as f: rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"), rss / 1024
+
+class ServerSampler:
+    def __init__(self, pid):
+        self.pid, self.peak, self.stop = pid, 0.0, threading.Event()
+        self.cpu0, self.rss0 = proc_cpu_rss(pid)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stop.wait(SAMPLE_SEC): self.peak = max(self.peak, proc_cpu_rss(self.pid)[1])
+
+    def __enter__(self):
+        self.wall0 = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set(); self.thread.join()
+        cpu, rss = proc_cpu_rss(self.pid)
+        self.wall, self.cpu, self.peak = time.perf_counter() - self.wall0, cpu - self.cpu0, max(self.peak, rss)
+
+
+def run_level(server, url, sessions, rounds, timeout, seed):
+    start_at = time.time() + START_DELAY_SEC
+    jobs = [(url, rounds, timeout, seed * 1000 + i, start_at) for i in range(sessions)]
+    with mp.get_context("spawn").Pool(processes=sessions) as pool:
+        pending = pool.map_async(client_process, jobs)
+        time.sleep(max(0, start_at - time.time()))
+        with ServerSampler(server.pid) as sm: results = pending.get()
+    latencies = [x for r in results for x in r["latencies"]]
+    errors = [r["error"] for r in results if r["error"]]
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {"sessions": sessions, "reruns": len(latencies), "errors": len(errors),
+            "p50": np.percentile(ms, 50), "p95": np.percentile(ms, 95), "p99": np.percentile(ms, 99),
+            "cpu_cores": sm.cpu / sm.wall, "rss_mb": sm.peak, "rss_per_session": (sm.peak - sm.rss0) / sessions,
+            "first_error": errors[0] if errors else ""}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--app", default="usa.py")
+    ap.add_argument("--sessions", default="1,5,10,20", help="comma-separated concurrent session counts")
+    ap.add_argument("--rounds", type=int, default=3, help="search/timeframe/calc rounds per session")
+    ap.add_argument("--latency-ms", type=float, default=50, help="mean stand-in upstream latency")
+    ap.add_argument("--timeout", type=float, default=120, help="per-rerun timeout (s)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--port", type=int, default=0, help="server port (default: a free one)")
+    ap.add_argument("--serve", action="store_true", help=argparse.SUPPRESS) # internal: run the server with stand-ins
+    args = ap.parse_args()
+    if args.serve: return serve(args.app, args.port, args.latency_ms / 1000)
+
+    port = args.port or free_port()
+    server = start_server(args.app, port, args.latency_ms / 1000, args.timeout)
+    try:
+        print(f"{'sessions':>8} {'reruns':>7} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'cores':>6} {'RSS MB':>7} {'RSS MB/sess':>11}")
+        for n in [int(x) for x in args.sessions.split(",") if x.strip()]:
+            r = run_level(server, f"ws://127.0.0.1:{port}/_stcore/stream", n, args.rounds, args.timeout, args.seed)
+            print(f"{r['sessions']:>8} {r['reruns']:>7} {r['errors']:>4} {r['p50']:>9.0f} {r['p95']:>9.0f} {r['p99']:>9.0f} {r['cpu_cores']:>6.2f} {r['rss_mb']:>7.0f} {r['rss_per_session']:>11.1f}")
+            if r['first_error']: print(f"         first error: {r['first_error']}")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,22 @@ import feedparser
 import nltk
 import urllib.parse
 import requests
+from requests.adapters import HTTPAdapter
 import datetime
 import re
+import json
+import os
+import csv
+import gzip
+import tempfile
+import sqlite3
+import hashlib
+import calendar
+import bisect
+import math
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+import threading
+import time
 
 # --- Libraries Setup ---
 try:
@@ -19,6 +33,19 @@ try:
 except ImportError:
     HAS_TRANSLATOR = False
 
+try:
+    from yfinance.exceptions import YFPricesMissingError, YFTzMissingError
+    YF_NO_DATA = (YFPricesMissingError, YFTzMissingError) # Yahoo answered: no rows for this symbol/range
+except ImportError:
+    YF_NO_DATA = () # older yfinance: every empty reply counts as an error
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
 try: 
     nltk.data.find('tokenizers/punkt')
 except LookupError: 
@@ -32,6 +59,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Initialize Session State
 if 'symbol' not in st.session_state: st.session_state.symbol = 'GOOGL'
 
@@ -159,14 +188,24 @@ st.markdown("""
 
 # --- 3. Functions ---
 
-@st.cache_data(ttl=300)
-def get_market_data(symbol, period, interval):
+CACHE_PROBE = threading.local() # miss: set by the cached body below; error: set when the fetch failed rather than came back empty
+CACHE_SEED = threading.local() # a value the cache warmer already fetched, consumed by the next cached body on its thread
+
+def seeded(fetch, *args):
+    val, CACHE_SEED.value = getattr(CACHE_SEED, 'value', None), None
+    return val if val is not None else fetch(*args)
+
+def fetch_market_data(symbol, period, interval):
+    CACHE_PROBE.error = False
     try:
         ticker = yf.Ticker(symbol)
-        df = ticker.history(period=period, interval=interval)
+        try: df = ticker.history(period=period, interval=interval, raise_errors=True)
+        except YF_NO_DATA: return pd.DataFrame()
+        except Exception: df = pd.DataFrame()
         
         if df.empty:
             df = yf.download(symbol, period=period, interval=interval, progress=False)
+            if df.empty: CACHE_PROBE.error = True # history failed and the fallback got nothing either
         
         if not df.empty and isinstance(df.columns, pd.MultiIndex):
             try:
@@ -179,10 +218,15 @@ def get_market_data(symbol, period, interval):
             
         return pd.DataFrame()
     except Exception as e:
+        CACHE_PROBE.error = True
         return pd.DataFrame()
 
-@st.cache_data(ttl=3600)
-def get_stock_info(symbol):
+@st.cache_data(ttl=300)
+def get_market_data(symbol, period, interval):
+    CACHE_PROBE.miss = True
+    return seeded(fetch_market_data, symbol, period, interval)
+
+def fetch_stock_info(symbol):
     try:
         ticker = yf.Ticker(symbol)
         info = ticker.info
@@ -190,6 +234,10 @@ def get_stock_info(symbol):
         return {} 
     except: return {}
 
+@st.cache_data(ttl=3600)
+def get_stock_info(symbol):
+    return seeded(fetch_stock_info, symbol)
+
 # [UPDATED] Super Robust Financial Data (Revenue, Net Income, Cash Flow)
 @st.cache_data(ttl=3600)
 def get_financial_data_robust(symbol):
@@ -301,6 +349,9 @@ def analyze_financial_health_score(df):
     return score, reasons, verdict, color
 
 def get_sector_pe_benchmark(sector):
+    # Live sector median from the cached universe; the constants below are the cold-start fallback
+    live = get_pe_benchmarks().stats_for(sector)
+    if live and live['n'] >= PE_MIN_SAMPLES: return live['median']
     benchmarks = {
         'Technology': 25, 'Financial Services': 15, 'Healthcare': 22, 
         'Consumer Cyclical': 20, 'Industrials': 20, 'Energy': 12,
@@ -422,51 +473,445 @@ def analyze_stock_guru(info, setup, symbol):
     else: status, color = "⚠️ High Risk / Expensive", "#FF1744"
     return {"verdict": status, "color": color, "val_score": val_score, "article": full_article, "reasons_q": reasons_q, "reasons_v": reasons_v}
 
+# [NEW] Shared HTTP Layer (keep-alive pool, ETag/Last-Modified, gzip, per-host token bucket)
+HTTP_POOL_SIZE = 20
+HTTP_RETRIES = 3
+HTTP_BACKOFF_SEC = 0.5
+HTTP_MAX_WAIT_SEC = 5 # a longer Retry-After means give up now rather than block the caller
+HTTP_RATE_LIMITS = {"api.bitkub.com": (5, 10), "news.google.com": (1, 5)} # host -> (tokens/sec, burst)
+HTTP_DEFAULT_RATE = (10, 20)
+HTTP_VALIDATOR_MAX = 512
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate, self.burst, self.tokens, self.ts, self.lock = rate, burst, float(burst), time.monotonic(), threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+                self.ts = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class HttpClient:
+    def __init__(self, pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter); self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": "Mozilla/5.0 (SmartTraderAI)"})
+        self.retries, self.buckets, self.validators, self.lock = retries, {}, {}, threading.Lock()
+
+    def bucket(self, host):
+        with self.lock:
+            if host not in self.buckets: self.buckets[host] = TokenBucket(*HTTP_RATE_LIMITS.get(host, HTTP_DEFAULT_RATE))
+            return self.buckets[host]
+
+    def get(self, url, timeout=5, conditional=True):
+        # Returns the response body (bytes) or None; a 304 returns the previously stored body
+        host = urllib.parse.urlsplit(url).netloc
+        cached = self.validators.get(url) if conditional else None
+        headers = {}
+        if cached:
+            if cached['etag']: headers['If-None-Match'] = cached['etag']
+            if cached['modified']: headers['If-Modified-Since'] = cached['modified']
+        for attempt in range(self.retries):
+            self.bucket(host).acquire()
+            try:
+                r = self.session.get(url, headers=headers, timeout=timeout)
+                if r.status_code == 304 and cached: return cached['body']
+                if r.status_code == 200:
+                    etag, modified = r.headers.get('ETag'), r.headers.get('Last-Modified')
+                    if conditional and (etag or modified):
+                        with self.lock:
+                            if len(self.validators) >= HTTP_VALIDATOR_MAX: self.validators.pop(next(iter(self.validators)))
+                            self.validators[url] = {'etag': etag, 'modified': modified, 'body': r.content}
+                    return r.content
+                if r.status_code != 429 and r.status_code < 500: return None
+                retry_after = r.headers.get('Retry-After', '')
+                delay = float(retry_after) if retry_after.isdigit() else HTTP_BACKOFF_SEC * (2 ** attempt)
+            except requests.RequestException: delay = HTTP_BACKOFF_SEC * (2 ** attempt)
+            if attempt == self.retries - 1 or delay > HTTP_MAX_WAIT_SEC: break
+            time.sleep(delay)
+        return None
+
+    def get_json(self, url, timeout=5):
+        body = self.get(url, timeout=timeout)
+        try: return json.loads(body) if body else None
+        except ValueError: return None
+
+@st.cache_resource
+def get_http_client():
+    return HttpClient()
+
+def fetch_bitkub_ticker():
+    return get_http_client().get_json("https://api.bitkub.com/api/market/ticker")
+
 @st.cache_data(ttl=15)
 def get_bitkub_ticker():
-    try:
-        r = requests.get("https://api.bitkub.com/api/market/ticker", timeout=5)
-        return r.json() if r.status_code == 200 else None
-    except: return None
+    return fetch_bitkub_ticker()
+
+# [NEW] Bitkub Intraday Bars (ticker snapshots -> OHLC ring buffers)
+BAR_TIMEFRAMES = {"1m": 60, "5m": 300}
+BAR_CAPACITY = 1440 # 1 day of 1m bars / 5 days of 5m bars per pair
+BAR_POLL_SEC = 10
+BAR_SPILL_DIR = os.environ.get("BITKUB_BAR_SPILL_DIR") # set to keep evicted bars on disk
+
+class BarRingBuffer:
+    # Fixed-size [time, open, high, low, close] array; the oldest bar is overwritten (and optionally spilled) when full
+    def __init__(self, capacity, tf_sec, spill_path=None):
+        self.buf = np.full((capacity, 5), np.nan)
+        self.capacity, self.tf_sec, self.spill_path = capacity, tf_sec, spill_path
+        self.head, self.count = 0, 0
+
+    def update(self, ts, price):
+        bucket = ts - (ts % self.tf_sec)
+        if self.count:
+            cur = self.buf[self.head]
+            if bucket < cur[0]: return # late snapshot, bar already closed
+            if bucket == cur[0]:
+                cur[2], cur[3], cur[4] = max(cur[2], price), min(cur[3], price), price
+                return
+        nxt = (self.head + 1) % self.capacity if self.count else 0
+        if self.count == self.capacity: self.spill(self.buf[nxt])
+        self.buf[nxt] = (bucket, price, price, price, price)
+        self.head, self.count = nxt, min(self.count + 1, self.capacity)
+
+    def spill(self, row):
+        if not self.spill_path: return
+        try:
+            with open(self.spill_path, "a") as f: f.write(",".join(f"{v:.10g}" for v in row) + "\n")
+        except: pass
+
+    def to_array(self):
+        start = (self.head - self.count + 1) % self.capacity
+        return self.buf[(start + np.arange(self.count)) % self.capacity].copy()
+
+class BitkubBarAggregator:
+    def __init__(self, timeframes=BAR_TIMEFRAMES, capacity=BAR_CAPACITY, spill_dir=BAR_SPILL_DIR, poll_sec=BAR_POLL_SEC):
+        self.timeframes, self.capacity, self.spill_dir, self.poll_sec = timeframes, capacity, spill_dir, poll_sec
+        self.buffers, self.lock, self.thread = {}, threading.Lock(), None
+        if spill_dir: os.makedirs(spill_dir, exist_ok=True)
+
+    def ingest(self, snapshot, ts=None):
+        # Accepts a polled ticker payload or a streamed {pair: {'last': ...}} message
+        if not snapshot: return
+        ts = int(ts if ts is not None else time.time())
+        with self.lock:
+            for pair, d in snapshot.items():
+                if not isinstance(d, dict) or not d.get('last'): continue
+                price = float(d['last'])
+                for tf, sec in self.timeframes.items():
+                    rb = self.buffers.get((pair, tf))
+                    if rb is None:
+                        spill = os.path.join(self.spill_dir, f"{pair}_{tf}.csv") if self.spill_dir else None
+                        rb = self.buffers[(pair, tf)] = BarRingBuffer(self.capacity, sec, spill)
+                    rb.update(ts, price)
+
+    def get_bars(self, pair, tf="1m"):
+        with self.lock:
+            rb = self.buffers.get((pair, tf))
+            arr = rb.to_array() if rb else np.empty((0, 5))
+        df = pd.DataFrame(arr[:, 1:], columns=['Open', 'High', 'Low', 'Close'], index=pd.to_datetime(arr[:, 0], unit='s', utc=True).tz_convert('Asia/Bangkok'))
+        df['Volume'] = 0.0 # ticker snapshots carry only rolling 24h volume
+        return df
+
+    def run(self):
+        while True:
+            self.ingest(fetch_bitkub_ticker())
+            time.sleep(self.poll_sec)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True, name="bitkub-bars")
+            self.thread.start()
+        return self
+
+@st.cache_resource
+def get_bitkub_bar_aggregator():
+    return BitkubBarAggregator().start()
+
+# [NEW] Headline Store (append-only, deduped by link hash) + Hourly Sentiment Series
+NEWS_DB_PATH = os.environ.get("NEWS_DB_PATH", os.path.join(APP_DIR, "news_store.db"))
+
+class HeadlineStore:
+    def __init__(self, path=NEWS_DB_PATH):
+        self.conn, self.lock = sqlite3.connect(path, check_same_thread=False), threading.Lock()
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS headlines (symbol TEXT, link_hash TEXT, published INTEGER, title TEXT, summary TEXT,
+                    link TEXT, score REAL, source TEXT, PRIMARY KEY (symbol, link_hash));
+                CREATE INDEX IF NOT EXISTS ix_headlines_sym_pub ON headlines (symbol, published);
+                CREATE INDEX IF NOT EXISTS ix_headlines_hash ON headlines (link_hash);
+                CREATE TABLE IF NOT EXISTS sentiment_hourly (symbol TEXT, bucket INTEGER, n INTEGER, score_sum REAL, PRIMARY KEY (symbol, bucket));
+            """)
+
+    @staticmethod
+    def link_hash(link):
+        return hashlib.sha1(link.encode('utf-8')).hexdigest()
+
+    def get(self, h):
+        # Any symbol's copy will do: score and translation depend only on the headline
+        with self.lock:
+            row = self.conn.execute("SELECT title, summary, score FROM headlines WHERE link_hash = ? LIMIT 1", (h,)).fetchone()
+        return {'title': row[0], 'summary': row[1], 'score': row[2]} if row else None
+
+    def append(self, symbol, h, published, item):
+        with self.lock, self.conn:
+            cur = self.conn.execute("INSERT OR IGNORE INTO headlines VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (symbol, h, published, item['title'], item['summary'], item['link'], item['score'], item['source']))
+            if cur.rowcount: # new headline for this symbol -> fold into its hourly bucket
+                self.conn.execute("""INSERT INTO sentiment_hourly VALUES (?, ?, 1, ?)
+                                     ON CONFLICT (symbol, bucket) DO UPDATE SET n = n + 1, score_sum = score_sum + excluded.score_sum""",
+                                  (symbol, published - published % 3600, item['score']))
+        return bool(cur.rowcount)
+
+    def sentiment_series(self, symbol, freq='1D'):
+        with self.lock:
+            rows = self.conn.execute("SELECT bucket, n, score_sum FROM sentiment_hourly WHERE symbol = ? ORDER BY bucket", (symbol,)).fetchall()
+        if not rows: return pd.DataFrame(columns=['n', 'score'])
+        arr = np.array(rows, dtype=float)
+        df = pd.DataFrame({'n': arr[:, 1], 'score_sum': arr[:, 2]}, index=pd.to_datetime(arr[:, 0], unit='s', utc=True))
+        df = df.resample(freq).sum()
+        df['score'] = df['score_sum'] / df['n'].where(df['n'] > 0)
+        return df[['n', 'score']]
+
+@st.cache_resource
+def get_headline_store():
+    return HeadlineStore()
+
+def news_sentiment_label(sc):
+    if sc > 0.05: return "ข่าวดี (Positive)", "🚀", "nc-pos"
+    elif sc < -0.05: return "ข่าวร้าย (Negative)", "🔻", "nc-neg"
+    return "ทั่วไป (Neutral)", "⚖️", "nc-neu"
 
 # --- NEWS SYSTEM (FREE & KEYLESS) ---
-@st.cache_data(ttl=3600)
-def get_ai_analyzed_news_thai(symbol):
+def fetch_ai_analyzed_news_thai(symbol):
     news_list = []
     translator = GoogleTranslator(source='auto', target='th') if HAS_TRANSLATOR else None
+    store = get_headline_store()
     
     # Use Google News RSS (Free, No Key)
     try:
         cl_sym = symbol.replace("-THB","").replace("-USD","").replace("=F","")
         q = urllib.parse.quote(f"site:bloomberg.com {cl_sym} market")
-        feed = feedparser.parse(f"https://news.google.com/rss/search?q={q}&hl=en-US&gl=US&ceid=US:en")
+        http = get_http_client()
+        feed = feedparser.parse(http.get(f"https://news.google.com/rss/search?q={q}&hl=en-US&gl=US&ceid=US:en") or b"")
         
         # Fallback to general search if bloomberg is empty
         if not feed.entries:
             q = urllib.parse.quote(f"{cl_sym} finance news")
-            feed = feedparser.parse(f"https://news.google.com/rss/search?q={q}&hl=en-US&gl=US&ceid=US:en")
+            feed = feedparser.parse(http.get(f"https://news.google.com/rss/search?q={q}&hl=en-US&gl=US&ceid=US:en") or b"")
             
         for i in feed.entries[:8]:
-            t, s = i.title, re.sub(re.compile('<.*?>'), '', getattr(i, 'summary', '') or getattr(i, 'description', ''))[:300]
-            sc = TextBlob(t).sentiment.polarity
-            
-            if sc > 0.05: lbl, icon, cls = "ข่าวดี (Positive)", "🚀", "nc-pos"
-            elif sc < -0.05: lbl, icon, cls = "ข่าวร้าย (Negative)", "🔻", "nc-neg"
-            else: lbl, icon, cls = "ทั่วไป (Neutral)", "⚖️", "nc-neu"
-            
-            t_th, s_th = t, s
-            if translator:
-                try: 
-                    t_th = translator.translate(t)
-                    if s: s_th = translator.translate(s) 
-                except: pass
+            h = HeadlineStore.link_hash(i.link)
+            pub = getattr(i, 'published_parsed', None)
+            published = calendar.timegm(pub) if pub else int(time.time())
+            known = store.get(h)
+            if known: t_th, s_th, sc = known['title'], known['summary'], known['score'] # already scored & translated
+            else:
+                t, s = i.title, re.sub(re.compile('<.*?>'), '', getattr(i, 'summary', '') or getattr(i, 'description', ''))[:300]
+                sc = TextBlob(t).sentiment.polarity
+                t_th, s_th = t, s
+                if translator:
+                    try: 
+                        t_th = translator.translate(t)
+                        if s: s_th = translator.translate(s) 
+                    except: pass
             
-            news_list.append({'title': t_th, 'summary': s_th, 'link': i.link, 'icon': icon, 'class': cls, 'label': lbl, 'score': sc, 'source': 'Google News'})
+            lbl, icon, cls = news_sentiment_label(sc)
+            item = {'title': t_th, 'summary': s_th, 'link': i.link, 'icon': icon, 'class': cls, 'label': lbl, 'score': sc, 'source': 'Google News'}
+            store.append(symbol, h, published, item)
+            news_list.append(item)
     except Exception as e: 
         pass
         
     return news_list[:10]
 
+@st.cache_data(ttl=3600)
+def get_ai_analyzed_news_thai(symbol):
+    return seeded(fetch_ai_analyzed_news_thai, symbol)
+
+def fetch_translation(text):
+    if not HAS_TRANSLATOR or not text: return None
+    try: return GoogleTranslator(source='auto', target='th').translate(text)
+    except: return None
+
+@st.cache_data(ttl=3600)
+def translate_th(text):
+    return seeded(fetch_translation, text) or text
+
+# [NEW] Cache Warmer (keeps default symbol, quick-picks & top-N recent symbols hot)
+WARM_SYMBOLS = ["GOOGL", "BTC-USD", "ETH-USD"] # default page + sidebar quick-picks
+WARM_DEFAULT_VIEW = ("6mo", "1d") # sidebar defaults for Period / Timeframe
+WARM_TOP_N = int(os.environ.get("WARM_TOP_N", 10))
+WARM_CYCLE_SEC = 30
+WARM_AHEAD = 0.8 # refresh once an entry has lived 80% of its TTL
+WARM_BUDGET_PER_MIN = {"yahoo": 30, "news": 6, "translate": 6}
+WARM_TRACK_MAX = 200 # requested keys remembered for top-N ranking
+
+class CacheWarmer:
+    def __init__(self, symbols=WARM_SYMBOLS, top_n=WARM_TOP_N, cycle_sec=WARM_CYCLE_SEC, budget=WARM_BUDGET_PER_MIN):
+        self.symbols, self.top_n, self.cycle_sec, self.budget = list(symbols), top_n, cycle_sec, budget
+        self.requested = {} # (symbol, period, interval) -> [count, last_ts]
+        self.warmed = {} # (job name, args) -> refresh ts
+        self.calls = {k: [] for k in budget}
+        self.hits, self.misses = 0, 0
+        self.lock, self.thread = threading.Lock(), None
+
+    def count_lookup(self, hit):
+        with self.lock:
+            if hit: self.hits += 1
+            else: self.misses += 1
+
+    def record(self, symbol, period, interval):
+        # Only called for lookups that returned data, so typos never enter the rotation
+        key = (symbol, period, interval)
+        with self.lock:
+            cnt = self.requested.get(key, [0, 0])
+            self.requested[key] = [cnt[0] + 1, time.time()]
+            if len(self.requested) > WARM_TRACK_MAX: self.requested.pop(min(self.requested, key=lambda k: self.requested[k][1]))
+
+    def forget(self, key):
+        with self.lock: self.requested.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "ratio": self.hits / total if total else 0.0, "keys": len(self.warmed)}
+
+    def targets(self):
+        with self.lock:
+            recent = sorted(self.requested.items(), key=lambda kv: (kv[1][1], kv[1][0]), reverse=True)[:self.top_n]
+        keys = [(s, *WARM_DEFAULT_VIEW) for s in self.symbols] + [k for k, _ in recent]
+        return list(dict.fromkeys(keys))
+
+    def allow(self, source):
+        # Shared per-minute budget: every background caller of an upstream goes through here
+        now = time.time()
+        with self.lock:
+            calls = self.calls[source] = [t for t in self.calls[source] if now - t < 60]
+            if len(calls) >= self.budget[source]: return False
+            calls.append(now)
+        return True
+
+    def refresh(self, name, func, fetch, args, ttl, source):
+        # Returns False when the upstream came back empty, True otherwise. The uncached fetch runs first and
+        # the cached entry is only replaced when it succeeded, so a transient error never evicts good data.
+        if time.time() - self.warmed.get((name, args), 0) < ttl * WARM_AHEAD or not self.allow(source): return True
+        CACHE_PROBE.error = False
+        try: res = fetch(*args)
+        except: return True
+        if CACHE_PROBE.error: return True # transient upstream failure, try again next cycle
+        if res is None or (res.empty if isinstance(res, pd.DataFrame) else not res): return False
+        try: func.clear(*args) # drop only this entry, then hand the fresh value to the cached body
+        except TypeError: pass
+        CACHE_SEED.value = res
+        try: func(*args)
+        except: pass
+        finally: CACHE_SEED.value = None
+        with self.lock: self.warmed[(name, args)] = time.time()
+        return True
+
+    def run_cycle(self):
+        neg = get_negative_cache()
+        for sym, per, itv in self.targets():
+            if neg.hit(sym): continue
+            if not self.refresh("market", get_market_data, fetch_market_data, (sym, per, itv), 300, "yahoo"):
+                self.forget((sym, per, itv)); continue
+            self.refresh("market", get_market_data, fetch_market_data, (sym, SWING_HISTORY.get(itv, "5y"), itv), 300, "yahoo") # long history for swing zones
+            self.refresh("info", get_stock_info, fetch_stock_info, (sym,), 3600, "yahoo")
+            self.refresh("news", get_ai_analyzed_news_thai, fetch_ai_analyzed_news_thai, (sym,), 3600, "news")
+            summary = get_stock_info(sym).get('longBusinessSummary')
+            if summary: self.refresh("translate", translate_th, fetch_translation, (summary[:2000],), 3600, "translate")
+
+    def run(self):
+        while True:
+            try: self.run_cycle()
+            except: pass
+            time.sleep(self.cycle_sec)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True, name="cache-warmer")
+            self.thread.start()
+        return self
+
+@st.cache_resource
+def get_cache_warmer():
+    return CacheWarmer().start()
+
+# [NEW] Local Symbol Directory (prefix index + negative cache for Smart Search)
+SYMBOL_FILE = os.path.join(APP_DIR, "symbols.csv")
+SUGGEST_K = 6
+NEG_CACHE_TTL = 3600
+NEG_CACHE_MAX = 1000
+YAHOO_INTRADAY_DAYS = {"5m": 60, "15m": 60, "1h": 730} # longer ranges come back empty for every symbol
+YAHOO_PERIOD_DAYS = {"1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 730, "5y": 1827, "10y": 3653, "max": float('inf')}
+
+def yahoo_range_ok(period, interval):
+    return YAHOO_PERIOD_DAYS.get(period, 0) <= YAHOO_INTRADAY_DAYS.get(interval, float('inf'))
+
+class SymbolDirectory:
+    # Each trie node keeps its own top-K symbols, so a prefix lookup is O(len(prefix))
+    def __init__(self, path=SYMBOL_FILE, k=SUGGEST_K):
+        self.names, self.trie, self.k = {}, {}, k
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f): self.add(row['symbol'].strip().upper(), row.get('name', '').strip())
+        except OSError: pass
+
+    def add(self, sym, name=""):
+        if sym in self.names: return
+        self.names[sym] = name
+        for key in [sym] + [w for w in re.split(r"[^A-Z0-9]+", name.upper()) if w]:
+            node = self.trie
+            for ch in key:
+                node = node.setdefault(ch, {})
+                top = node.setdefault('$', [])
+                if len(top) < self.k and sym not in top: top.append(sym)
+
+    def __contains__(self, sym):
+        return sym in self.names
+
+    def suggest(self, prefix):
+        node = self.trie
+        for ch in prefix.strip().upper():
+            node = node.get(ch)
+            if node is None: return []
+        return [(s, self.names[s]) for s in node.get('$', [])]
+
+class NegativeCache:
+    def __init__(self, ttl=NEG_CACHE_TTL):
+        self.ttl, self.expiry, self.lock = ttl, {}, threading.Lock()
+
+    def add(self, key):
+        with self.lock:
+            self.expiry[key] = time.time() + self.ttl
+            if len(self.expiry) > NEG_CACHE_MAX: self.expiry.pop(min(self.expiry, key=self.expiry.get))
+
+    def discard(self, key):
+        with self.lock: self.expiry.pop(key, None)
+
+    def hit(self, key):
+        exp = self.expiry.get(key)
+        if exp is None: return False
+        if exp > time.time(): return True
+        with self.lock: self.expiry.pop(key, None)
+        return False
+
+@st.cache_resource
+def get_symbol_directory():
+    return SymbolDirectory()
+
+@st.cache_resource
+def get_negative_cache():
+    return NegativeCache()
+
 def calculate_technical_setup(df):
     try:
         delta = df['Close'].diff()
@@ -495,6 +940,53 @@ def calculate_dynamic_levels(df):
         return {"EMA 20": df['Close'].ewm(span=20).mean().iloc[-1], "EMA 50": df['Close'].ewm(span=50).mean().iloc[-1], "EMA 200": df['Close'].ewm(span=200).mean().iloc[-1], "BB Upper": sma+(2*std), "BB Lower": sma-(2*std), "Current": df['Close'].iloc[-1]}
     except: return None
 
+# [NEW] Swing S/R Engine (O(n) swing detection + 1-D log-price clustering into scored zones)
+SWING_WINDOW = 5 # bars on each side that a swing high/low must dominate
+SWING_ZONE_RANGE = 0.5 # swings within this fraction of the median bar range (in %) share a zone
+SWING_ZONE_MAX_TOL = 3 # a zone never spans more than this many tolerances
+SWING_MAX_ZONES = 6
+SWING_HISTORY = {"1d": "10y", "1wk": "max", "1h": "2y", "15m": "1mo", "5m": "1mo"} # longest Yahoo range per interval
+
+def detect_swing_zones(df, window=SWING_WINDOW, max_zones=SWING_MAX_ZONES):
+    try:
+        high, low, close = df['High'].to_numpy(float), df['Low'].to_numpy(float), df['Close'].to_numpy(float)
+        vol = np.nan_to_num(df['Volume'].to_numpy(float)) if 'Volume' in df.columns else np.ones(len(df))
+        n, w = len(df), 2 * window + 1
+        if n < w: return []
+
+        # Swing = bar that is the extreme of its centred window (rolling max/min are single-pass)
+        is_hi = df['High'].rolling(w, center=True).max().to_numpy() == high
+        is_lo = df['Low'].rolling(w, center=True).min().to_numpy() == low
+        pos = np.concatenate([np.flatnonzero(is_hi), np.flatnonzero(is_lo)])
+        price = np.concatenate([high[is_hi], low[is_lo]])
+        if len(price) < 2: return []
+
+        # 1-D clustering on log price (percentage tolerance, so multi-year trends don't chain into one zone):
+        # sort, then start a new zone on a gap wider than tol or once the zone is SWING_ZONE_MAX_TOL tolerances wide
+        order = np.argsort(price, kind='stable')
+        price, pos = price[order], pos[order]
+        lp = np.log(price)
+        bar_pct = np.nanmedian((high - low) / np.where(close > 0, close, np.nan))
+        tol = max(np.log1p(bar_pct * SWING_ZONE_RANGE) if np.isfinite(bar_pct) else 0.0, 0.001)
+        labels, lab, start = np.zeros(len(lp), dtype=int), 0, lp[0]
+        for i in range(1, len(lp)): # single pass over swings only (~n / window points)
+            if lp[i] - lp[i - 1] > tol or lp[i] - start > SWING_ZONE_MAX_TOL * tol: lab, start = lab + 1, lp[i]
+            labels[i] = lab
+        starts = np.flatnonzero(np.r_[True, np.diff(labels) > 0])
+        ends = np.r_[starts[1:], len(price)] - 1
+
+        touches = np.bincount(labels)
+        vol_sum = np.bincount(labels, weights=vol[pos])
+        center = np.bincount(labels, weights=price) / touches
+        last_seen = np.maximum.reduceat(pos, starts) / (n - 1)
+        score = touches / touches.max() * 60 + (vol_sum / vol_sum.max() * 30 if vol_sum.max() > 0 else 0) + last_seen * 10
+
+        keep = np.flatnonzero(touches >= 2)
+        keep = keep[np.argsort(-score[keep])][:max_zones]
+        return [{"type": "Resistance" if center[i] > close[-1] else "Support", "low": price[starts[i]], "high": price[ends[i]],
+                 "center": center[i], "touches": int(touches[i]), "volume": vol_sum[i], "score": score[i]} for i in keep]
+    except: return []
+
 def generate_dynamic_insight(price, pivots, dynamics):
     e200, e20 = dynamics['EMA 200'], dynamics['EMA 20']
     if price > e200: msg, col, icon = "Bullish Strong (แกร่งมาก)", "#00E676", "🐂" if price > e20 else ("Bullish Retrace (ย่อตัว)", "#00E676", "📉")
@@ -609,6 +1101,369 @@ def analyze_bitkub_static_guru(price, static_lvls):
         
     return verdict, color, desc, strat
 
+# [NEW] All-Pairs Bitkub Market Scan (vectorized over the whole ticker payload)
+def calculate_bitkub_market_table(bk_data):
+    try:
+        raw = pd.DataFrame.from_dict({k: v for k, v in bk_data.items() if isinstance(v, dict) and k.startswith('THB_')}, orient='index')
+        if raw.empty: return pd.DataFrame()
+        cols = ['last', 'high24hr', 'low24hr', 'percentChange', 'quoteVolume']
+        raw = raw.reindex(columns=cols).apply(pd.to_numeric, errors='coerce').fillna(0.0)
+        last, h24, l24 = raw['last'].to_numpy(float), raw['high24hr'].to_numpy(float), raw['low24hr'].to_numpy(float)
+
+        # Fibonacci zones (same rules as calculate_bitkub_ai_levels)
+        diff = np.where((h24 - l24) == 0, 1.0, h24 - l24)
+        fib_top, fib_mid, fib_bot = h24 - diff * 0.236, h24 - diff * 0.5, h24 - diff * 0.618
+        status = np.select([last > fib_top, last < fib_bot], ["BULLISH BREAKOUT", "BEARISH DIP"], "NEUTRAL")
+
+        # Round-number S/R (same rules as calculate_static_round_numbers)
+        step = np.select([last < 10, last < 100, last < 1000, last < 10000, last < 100000], [0.5, 5, 50, 500, 5000], 10000)
+        floor_val = (np.trunc(last) // step) * step
+        ceil_val = floor_val + step
+        floor_val, ceil_val = np.where(last > 0, floor_val, 0), np.where(last > 0, ceil_val, 0)
+
+        # Bias (same rules as analyze_bitkub_static_guru)
+        bias = np.where(last > (ceil_val + floor_val) / 2, "Uptrend Bias", "Downtrend Bias")
+
+        table = pd.DataFrame({
+            "Pair": raw.index.str.replace("THB_", "", regex=False),
+            "Last": last, "Chg %": raw['percentChange'].to_numpy(float), "Vol (THB)": raw['quoteVolume'].to_numpy(float),
+            "Status": status, "Bias": bias,
+            "Fib 0.236": fib_top, "Mid 50%": fib_mid, "Fib 0.618": fib_bot,
+            "Res 1": ceil_val, "Sup 1": floor_val,
+            "Range Pos %": np.clip((last - l24) / diff * 100, 0, 100),
+        })
+        return table.sort_values("Vol (THB)", ascending=False).reset_index(drop=True)
+    except: return pd.DataFrame()
+
+
+# [NEW] Portfolio Risk Engine (incremental covariance over cached daily returns)
+RISK_LOOKBACK = 250 # trading days of daily returns
+
+class PortfolioRiskEngine:
+    def __init__(self, lookback=RISK_LOOKBACK):
+        self.grid = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=lookback + 1)
+        self.symbols, self.positions = [], {}
+        self.rets = np.empty((lookback, 0)) # demeaned returns, one column per symbol
+        self.cov = np.empty((0, 0))
+
+    def align_returns(self, df):
+        close, idx = df['Close'].copy(), pd.DatetimeIndex(df.index)
+        close.index = (idx.tz_localize(None) if idx.tz is not None else idx).normalize()
+        close = close[~close.index.duplicated(keep='last')].reindex(self.grid, method='ffill')
+        r = close.pct_change().to_numpy(float)[1:]
+        return np.nan_to_num(r - np.nanmean(r) if np.isfinite(r).any() else r)
+
+    def add(self, symbol, df, entry, sl, risk_pct):
+        self.positions[symbol] = {"entry": entry, "sl": sl, "risk_pct": risk_pct}
+        if symbol in self.symbols: return
+        x = self.align_returns(df)
+        n = self.rets.shape[0] - 1
+        cross = (self.rets.T @ x) / n # O(T*k): only the new row/column is computed
+        var = (x @ x) / n
+        self.cov = np.block([[self.cov, cross[:, None]], [cross[None, :], np.array([[var]])]]) if self.symbols else np.array([[var]])
+        self.rets = np.column_stack([self.rets, x])
+        self.symbols.append(symbol)
+
+    def remove(self, symbol):
+        self.positions.pop(symbol, None)
+        if symbol not in self.symbols: return
+        i = self.symbols.index(symbol)
+        self.cov = np.delete(np.delete(self.cov, i, axis=0), i, axis=1)
+        self.rets = np.delete(self.rets, i, axis=1)
+        self.symbols.pop(i)
+
+    def corr(self):
+        sd = np.sqrt(np.diag(self.cov))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            c = self.cov / np.outer(sd, sd)
+        return pd.DataFrame(np.nan_to_num(c), index=self.symbols, columns=self.symbols)
+
+    def summary(self, balance):
+        if not self.symbols: return pd.DataFrame(), {}
+        p = [self.positions[s] for s in self.symbols]
+        entry, sl = np.array([x['entry'] for x in p], float), np.array([x['sl'] for x in p], float)
+        risk_amt = balance * np.array([x['risk_pct'] for x in p], float) / 100
+        side = np.sign(entry - sl) # stop below entry = long, above = short
+        per_unit = np.abs(entry - sl)
+        qty = np.divide(risk_amt, per_unit, out=np.zeros_like(risk_amt), where=per_unit > 0)
+        cost = qty * entry
+        w = side * cost / balance if balance else np.zeros_like(cost) # signed, so shorts and hedges offset longs
+        vol = float(np.sqrt(max(w @ self.cov @ w, 0)))
+        table = pd.DataFrame({"Symbol": self.symbols, "Side": np.where(side < 0, "Short", "Long"), "Entry": entry, "Stop Loss": sl,
+                              "Qty": qty, "Cost": cost, "Risk": risk_amt, "Weight %": w * 100})
+        totals = {"cost": cost.sum(), "risk": risk_amt.sum(), "risk_pct": risk_amt.sum() / balance * 100 if balance else 0,
+                  "vol_pct": vol * 100, "var95": 1.645 * vol * balance}
+        return table, totals
+
+# [NEW] Sector P/E Benchmarks (cached universe, per-sector sorted P/E lists, O(1) lookups)
+PE_DB_PATH = os.environ.get("PE_DB_PATH", os.path.join(APP_DIR, "pe_universe.db"))
+PE_UNIVERSE = [x.strip().upper() for x in os.environ.get("PE_UNIVERSE", "").split(",") if x.strip()] # default: equities in symbols.csv
+PE_MIN_SAMPLES = 5
+PE_REFRESH_SEC = 6 # at most one ticker.info refresh per tick, drawn from the warmer's Yahoo budget
+PE_MAX_AGE = 86400
+
+def valid_pe(pe):
+    return float(pe) if isinstance(pe, (int, float)) and math.isfinite(pe) and pe > 0 else None
+
+def quantile_sorted(vals, q):
+    pos = (len(vals) - 1) * q
+    lo = int(pos)
+    return vals[lo] + (vals[min(lo + 1, len(vals) - 1)] - vals[lo]) * (pos - lo)
+
+class SectorPEBenchmarks:
+    def __init__(self, path=PE_DB_PATH, universe=None, warmer=None):
+        self.universe = universe or [s for s in get_symbol_directory().names if not re.search(r"[-=^]", s)]
+        self.warmer = warmer
+        self.rows, self.by_sector, self.stats = {}, {}, {} # symbol -> (sector, pe, ts) / sector -> sorted P/Es / sector -> summary
+        self.lock, self.thread = threading.Lock(), None
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS sector_pe (symbol TEXT PRIMARY KEY, sector TEXT, pe REAL, updated INTEGER)")
+            for sym, sector, pe, ts in self.conn.execute("SELECT symbol, sector, pe, updated FROM sector_pe"):
+                self.rows[sym] = (sector, pe, ts)
+                if sector and pe is not None: bisect.insort(self.by_sector.setdefault(sector, []), pe)
+        for sector in self.by_sector: self.restat(sector)
+        self.universe = list(dict.fromkeys(self.universe + list(self.rows))) # stored symbols stay in the refresh rotation
+
+    def track(self, symbol, sector, pe):
+        # Runs on every rerun: a viewed equity joins the refresh rotation, but disk is only touched when its row changed or went stale
+        pe = valid_pe(pe)
+        if not sector or pe is None: return # crypto, ETFs, loss-makers: nothing to benchmark
+        with self.lock:
+            if symbol not in self.universe: self.universe.append(symbol)
+            old = self.rows.get(symbol)
+        if old and old[:2] == (sector, pe) and time.time() - old[2] < PE_MAX_AGE: return
+        self.update(symbol, sector, pe)
+
+    def restat(self, sector):
+        vals = self.by_sector.get(sector) or []
+        self.stats[sector] = {'n': len(vals), 'median': quantile_sorted(vals, 0.5), 'p25': quantile_sorted(vals, 0.25), 'p75': quantile_sorted(vals, 0.75)} if vals else None
+
+    def update(self, symbol, sector, pe):
+        pe = valid_pe(pe)
+        now = int(time.time())
+        with self.lock:
+            old_sector, old_pe, _ = self.rows.get(symbol, (None, None, 0))
+            if old_sector and old_pe is not None:
+                lst = self.by_sector[old_sector]
+                del lst[bisect.bisect_left(lst, old_pe)]
+            if sector and pe is not None: bisect.insort(self.by_sector.setdefault(sector, []), pe)
+            self.rows[symbol] = (sector, pe, now)
+            for sec in {old_sector, sector} - {None}: self.restat(sec)
+            with self.conn: self.conn.execute("INSERT OR REPLACE INTO sector_pe VALUES (?, ?, ?, ?)", (symbol, sector, pe, now))
+
+    def stats_for(self, sector):
+        return self.stats.get(sector)
+
+    def percentile(self, sector, pe):
+        vals = self.by_sector.get(sector) or []
+        return bisect.bisect_left(vals, pe) / len(vals) * 100 if vals else None
+
+    def run(self):
+        while True:
+            try:
+                with self.lock: stalest = min(self.universe, key=lambda s: self.rows.get(s, (None, None, 0))[2], default=None)
+                if stalest and time.time() - self.rows.get(stalest, (None, None, 0))[2] > PE_MAX_AGE and (self.warmer is None or self.warmer.allow("yahoo")):
+                    info = fetch_stock_info(stalest)
+                    if info: self.update(stalest, info.get('sector'), info.get('trailingPE')) # an empty reply is an error, keep the old row
+            except: pass
+            time.sleep(PE_REFRESH_SEC)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True, name="sector-pe")
+            self.thread.start()
+        return self
+
+@st.cache_resource
+def get_pe_benchmarks():
+    return SectorPEBenchmarks(universe=PE_UNIVERSE, warmer=get_cache_warmer()).start()
+
+# [NEW] Multi-Symbol Comparison (one index join -> contiguous float block -> vectorized metrics)
+COMPARE_MAX = 30
+
+def align_close_block(frames, interval):
+    cols = []
+    for sym, df in frames.items():
+        idx = pd.DatetimeIndex(df.index)
+        if interval in ("1d", "1wk"): idx = (idx.tz_localize(None) if idx.tz is not None else idx).normalize() # session date, any venue
+        else: idx = idx.tz_convert('UTC') if idx.tz is not None else idx.tz_localize('UTC')
+        close = pd.Series(df['Close'].to_numpy(float), index=idx, name=sym)
+        cols.append(close[~close.index.duplicated(keep='last')])
+    joined = pd.concat(cols, axis=1, join='outer').sort_index().ffill().dropna() # 24/7 vs session gaps are carried forward
+    return joined.index, list(joined.columns), np.ascontiguousarray(joined.to_numpy(dtype=np.float64))
+
+def rolling_corr_vs_first(rets, window):
+    # Window sums from cumulative sums: O(T*N) regardless of window size
+    T = rets.shape[0]
+    if T < window: return np.full((0, rets.shape[1]), np.nan)
+    x = rets[:, :1]
+    def wsum(a):
+        c = np.cumsum(np.vstack([np.zeros((1, a.shape[1])), a]), axis=0)
+        return c[window:] - c[:-window]
+    sx, sy, sxx, syy, sxy = wsum(x), wsum(rets), wsum(x * x), wsum(rets * rets), wsum(x * rets)
+    cov, vx, vy = sxy - sx * sy / window, sxx - sx * sx / window, syy - sy * sy / window
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return cov / np.sqrt(vx * vy)
+
+@st.cache_data(ttl=300)
+def build_comparison(symbols, period, interval, window):
+    frames = {s: get_market_data(s, period, interval) for s in symbols}
+    missing = [s for s, df in frames.items() if df.empty]
+    frames = {s: df for s, df in frames.items() if not df.empty}
+    if len(frames) < 2: return None, missing
+    idx, syms, block = align_close_block(frames, interval)
+    if len(block) < 3: return None, missing
+    norm = block / block[0] * 100 # rebased to 100
+    rel = norm / norm[:, :1] # relative strength vs first symbol
+    rets = block[1:] / block[:-1] - 1
+    corr = rolling_corr_vs_first(rets, window)
+    summary = pd.DataFrame({"Symbol": syms, "Return %": norm[-1] - 100, "RS vs " + syms[0]: rel[-1],
+                            "Volatility %": rets.std(axis=0) * 100, f"Corr ({window})": corr[-1] if len(corr) else np.nan})
+    return {"index": idx, "symbols": syms, "norm": norm, "rel": rel, "corr": corr, "corr_index": idx[window:], "summary": summary}, missing
+
+# [NEW] Bulk Export (one symbol per chunk, written straight to disk)
+EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "smart_trader_exports"))
+EXPORT_KEEP_SEC = 3600 # older export files are removed before each new export
+EXPORT_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+EXPORT_FORMATS = {"CSV (gzip)": ("csv.gz", "application/gzip")}
+if HAS_PYARROW: EXPORT_FORMATS.update({"Parquet": ("parquet", "application/octet-stream"), "Arrow IPC": ("arrow", "application/vnd.apache.arrow.file")})
+
+def iter_export_chunks(symbols, period, interval):
+    for sym in symbols:
+        df = fetch_market_data(sym, period, interval) # uncached: bulk histories must not pile up in st.cache_data
+        if df.empty:
+            yield sym, None
+            continue
+        out = df.reindex(columns=EXPORT_COLUMNS).astype('float64')
+        idx = pd.DatetimeIndex(out.index)
+        out.index = idx.tz_convert('UTC') if idx.tz is not None else idx.tz_localize('UTC')
+        out.index.name = 'Datetime'
+        out.insert(0, 'Symbol', sym)
+        yield sym, out.reset_index()
+
+def clean_old_exports(max_age=EXPORT_KEEP_SEC):
+    now = time.time()
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if name.startswith("market_") and now - os.path.getmtime(path) > max_age: os.remove(path)
+        except OSError: pass
+
+def write_bulk_export(symbols, period, interval, fmt, on_progress=None):
+    ext, _ = EXPORT_FORMATS[fmt]
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    clean_old_exports()
+    path = os.path.join(EXPORT_DIR, f"market_{period}_{interval}_{int(time.time())}.{ext}")
+    writer, rows, done = None, 0, 0
+    try:
+        if fmt == "CSV (gzip)": writer = gzip.open(path, 'wt', newline='', encoding='utf-8')
+        for sym, chunk in iter_export_chunks(symbols, period, interval):
+            done += 1 # every symbol attempted, so the bar reaches 100% even when some come back empty
+            if chunk is not None:
+                if fmt == "CSV (gzip)": chunk.to_csv(writer, header=(rows == 0), index=False, date_format='%Y-%m-%dT%H:%M:%SZ')
+                else:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None: writer = pq.ParquetWriter(path, table.schema, compression='zstd') if fmt == "Parquet" else pa.ipc.new_file(path, table.schema)
+                    writer.write_table(table)
+                rows += len(chunk)
+            if on_progress: on_progress(done / len(symbols), sym)
+    finally:
+        if writer is not None: writer.close()
+    return (path if rows else None), rows
+
+# [NEW] Off-Thread Analysis (CPU-only worker pool + per-session cancellation of stale reruns)
+COMPUTE_WORKERS = int(os.environ.get("COMPUTE_WORKERS", 4))
+COMPUTE_POLL_SEC = 0.1
+
+class AnalysisCancelled(Exception):
+    pass
+
+class CancelToken:
+    def __init__(self): self.event = threading.Event()
+    def cancel(self): self.event.set()
+    def check(self):
+        if self.event.is_set(): raise AnalysisCancelled()
+
+@st.cache_resource
+def get_compute_pool():
+    return ThreadPoolExecutor(max_workers=COMPUTE_WORKERS, thread_name_prefix="analysis")
+
+def run_offthread(fn, *args, label="🚀 AI Analyzing"):
+    # One live job per session: a newer request cancels the previous token. While waiting, the placeholder
+    # update yields to Streamlit so a pending rerun interrupts this run instead of waiting for dead work.
+    prev = st.session_state.get('compute_token')
+    if prev: prev.cancel()
+    token = st.session_state.compute_token = CancelToken()
+    fut, ph, i = get_compute_pool().submit(fn, token, *args), st.empty(), 0
+    try:
+        while True:
+            try: return fut.result(timeout=COMPUTE_POLL_SEC)
+            except FuturesTimeout:
+                ph.caption(f"{label}{'.' * (i % 4)}"); i += 1
+    finally:
+        if not fut.done():
+            token.cancel()
+            fut.cancel() # frees the pool slot if the job has not started yet
+        ph.empty()
+
+def build_price_chart(df, chart_type):
+    exp12 = df['Close'].ewm(span=12, adjust=False).mean()
+    exp26 = df['Close'].ewm(span=26, adjust=False).mean()
+    macd = exp12 - exp26
+    signal_line = macd.ewm(span=9, adjust=False).mean()
+    macd_hist = macd - signal_line
+
+    fig = make_subplots(
+        rows=3, cols=1, 
+        shared_xaxes=True, 
+        vertical_spacing=0.03, 
+        row_heights=[0.6, 0.15, 0.25],
+        specs=[[{"secondary_y": False}], [{"secondary_y": False}], [{"secondary_y": True}]]
+    )
+
+    if chart_type == "Heikin Ashi":
+        ha = calculate_heikin_ashi(df)
+        fig.add_trace(go.Candlestick(x=df.index, open=ha['Open'], high=ha['High'], low=ha['Low'], close=ha['Close'], name="HA"), row=1, col=1)
+    else:
+        fig.add_trace(go.Candlestick(x=df.index, open=df['Open'], high=df['High'], low=df['Low'], close=df['Close'], name="Price"), row=1, col=1)
+    
+    fig.add_trace(go.Scatter(x=df.index, y=df['Close'].ewm(span=50).mean(), line=dict(color='#2979FF', width=1.5), name="EMA50"), row=1, col=1)
+    fig.add_trace(go.Scatter(x=df.index, y=df['Close'].ewm(span=200).mean(), line=dict(color='#FF9100', width=1.5), name="EMA200"), row=1, col=1)
+
+    colors_vol = np.where(df['Open'] < df['Close'], '#00E676', '#FF1744')
+    fig.add_trace(go.Bar(x=df.index, y=df['Volume'], name='Volume', marker_color=colors_vol, showlegend=False), row=2, col=1)
+
+    fig.add_trace(go.Bar(x=df.index, y=macd_hist, name='MACD Hist', marker_color='#00E5FF'), row=3, col=1)
+    fig.add_trace(go.Scatter(x=df.index, y=macd, line=dict(color='#fff', width=1), name='MACD'), row=3, col=1)
+    fig.add_trace(go.Scatter(x=df.index, y=signal_line, line=dict(color='#FFD600', width=1), name='Signal'), row=3, col=1)
+
+    fig.update_layout(
+        template='plotly_dark', 
+        height=700, 
+        margin=dict(l=0,r=0,t=0,b=0), 
+        paper_bgcolor='rgba(0,0,0,0)', 
+        plot_bgcolor='rgba(0,0,0,0)',
+        xaxis_rangeslider_visible=False
+    )
+    return fig
+
+def load_analysis_inputs(symbol, interval):
+    # Cached/network fetches run on the session's own script thread, so a cold symbol never holds a pool worker
+    return {'news': get_ai_analyzed_news_thai(symbol), 'info': get_stock_info(symbol),
+            # second, multi-year fetch on a cold symbol/interval; the cache warmer prefetches it for warmed symbols
+            'hist': get_market_data(symbol, SWING_HISTORY.get(interval, "5y"), interval), 'fin_df': get_financial_data_robust(symbol)}
+
+def run_full_analysis(token, df, chart_type, inputs):
+    # CPU-only: indicators, figure, pivots, swing zones
+    token.check()
+    setup = calculate_technical_setup(df); token.check()
+    fig = build_price_chart(df, chart_type); token.check()
+    pivots, dynamic = calculate_pivot_points(df), calculate_dynamic_levels(df); token.check()
+    hist, fin_df = inputs['hist'], inputs['fin_df']
+    zones = detect_swing_zones(hist if not hist.empty else df); token.check()
+    fin_health = analyze_financial_health_score(fin_df) if fin_df is not None else None
+    return {'setup': setup, 'news': inputs['news'], 'info': inputs['info'], 'fig': fig, 'pivots': pivots, 'dynamic': dynamic, 'zones': zones, 'fin_df': fin_df, 'fin_health': fin_health}
 
 # --- 4. Sidebar ---
 with st.sidebar:
@@ -619,6 +1474,7 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### 🇹🇭 Bitkub Rate")
     bk_data = get_bitkub_ticker()
+    bk_bars = get_bitkub_bar_aggregator() # fed only by its own poller, cached snapshots carry no timestamp
     if bk_data:
         b, e = bk_data.get('THB_BTC',{}), bk_data.get('THB_ETH',{})
         st.markdown(f"**BTC:** <span style='color:#00E676'>{b.get('last',0):,.0f}</span>", unsafe_allow_html=True)
@@ -627,6 +1483,7 @@ with st.sidebar:
     chart_type = st.selectbox("Chart Style", ["Candlestick", "Heikin Ashi"])
     period = st.select_slider("Period", ["1mo","3mo","6mo","1y"], value="6mo")
     interval = st.selectbox("Timeframe", ["1d", "1wk", "1h", "15m", "5m"], index=0)
+    warmer = get_cache_warmer()
 
 # --- 5. Main ---
 st.markdown("<h2 style='color:#00E5FF;'>🔍 Smart Search</h2>", unsafe_allow_html=True)
@@ -634,13 +1491,30 @@ c1, c2 = st.columns([3, 1])
 with c1: sym_input = st.text_input("Symbol", st.session_state.symbol, label_visibility="collapsed")
 with c2: 
     if st.button("วิเคราะห์ ⚡", use_container_width=True): 
+        get_negative_cache().discard(sym_input.strip().upper()) # an explicit search always asks upstream again
         set_symbol(sym_input); st.rerun()
 
+sym_dir, neg_cache = get_symbol_directory(), get_negative_cache()
+sym_typed = sym_input.strip().upper()
+if sym_typed and sym_typed not in sym_dir:
+    sugg = sym_dir.suggest(sym_typed)
+    if sugg:
+        sg_cols = st.columns(len(sugg))
+        for sg_col, (sg_sym, sg_name) in zip(sg_cols, sugg): sg_col.button(sg_sym, key=f"sg_{sg_sym}", help=sg_name, on_click=set_symbol, args=(sg_sym,))
+
 symbol = st.session_state.symbol.upper()
 
 if symbol:
-    with st.spinner("🚀 AI Analyzing..."):
-        df = get_market_data(symbol, period, interval)
+    if neg_cache.hit(symbol): df = pd.DataFrame() # known-empty symbol, skip both upstream calls at any timeframe
+    else:
+        CACHE_PROBE.miss = CACHE_PROBE.error = False
+        with st.spinner("🚀 AI Analyzing..."):
+            df = get_market_data(symbol, period, interval)
+        warmer.count_lookup(not CACHE_PROBE.miss)
+        # only a fresh, error-free "no rows" reply counts; directory symbols and out-of-range intraday requests never do
+        if df.empty and CACHE_PROBE.miss and not CACHE_PROBE.error and symbol not in sym_dir and yahoo_range_ok(period, interval): neg_cache.add(symbol)
+        elif df.empty and CACHE_PROBE.error: get_market_data.clear(symbol, period, interval) # don't keep a failed fetch for the TTL
+        elif not df.empty: warmer.record(symbol, period, interval)
     
     if not df.empty:
         # [NEW FEATURE] Download Button in Sidebar
@@ -660,9 +1534,11 @@ if symbol:
         curr, chg = df['Close'].iloc[-1], df['Close'].iloc[-1] - df['Close'].iloc[-2]
         pct, color = (chg / df['Close'].iloc[-2]) * 100, "#00E676" if chg >= 0 else "#FF1744"
         
-        setup = calculate_technical_setup(df)
-        news = get_ai_analyzed_news_thai(symbol)
-        info = get_stock_info(symbol) 
+        with st.spinner("🚀 AI Analyzing..."): ana_inputs = load_analysis_inputs(symbol, interval)
+        try: ana = run_offthread(run_full_analysis, df, chart_type, ana_inputs)
+        except AnalysisCancelled: st.stop() # superseded by a newer request in this session
+        setup, news, info = ana['setup'], ana['news'], ana['info']
+        if info: get_pe_benchmarks().track(symbol, info.get('sector'), info.get('trailingPE')) # every viewed symbol refreshes its sector
         
         t_txt, n_txt, ai_sc, ai_vd = gen_ai_verdict(setup, news)
         sc_col, sc_glow = ("#00E676", "0, 230, 118") if ai_sc >= 70 else ("#FF1744", "255, 23, 68") if ai_sc <= 30 else ("#FFD600", "255, 214, 0")
@@ -670,48 +1546,10 @@ if symbol:
 
         st.markdown(f"""<div class="glass-card" style="border-top:5px solid {color};text-align:center;"><div style="font-size:3.5rem;font-weight:900;line-height:1;margin-bottom:10px;">{symbol}</div><div style="font-size:3rem;color:{color};font-weight:bold;">{curr:,.2f}</div><div style="background:rgba({sc_glow}, 0.2);padding:5px 20px;border-radius:20px;display:inline-block;margin-top:10px;"><span style="color:{color};font-weight:bold;font-size:1.1rem;">{chg:+.2f} ({pct:+.2f}%)</span></div></div>""", unsafe_allow_html=True)
 
-        tabs = st.tabs(["📈 Chart", "📊 Stats", "📰 AI News", "🎯 Setup", "🤖 Verdict", "🛡️ S/R Dynamic", "🧠 AI Guru", "💰 Financials", "🇹🇭 Bitkub AI", "🧮 Calc"])
+        tabs = st.tabs(["📈 Chart", "📊 Stats", "📰 AI News", "🎯 Setup", "🤖 Verdict", "🛡️ S/R Dynamic", "🧠 AI Guru", "💰 Financials", "🇹🇭 Bitkub AI", "🧮 Calc", "🔀 Compare"])
 
         with tabs[0]:
-            exp12 = df['Close'].ewm(span=12, adjust=False).mean()
-            exp26 = df['Close'].ewm(span=26, adjust=False).mean()
-            macd = exp12 - exp26
-            signal_line = macd.ewm(span=9, adjust=False).mean()
-            macd_hist = macd - signal_line
-
-            fig = make_subplots(
-                rows=3, cols=1, 
-                shared_xaxes=True, 
-                vertical_spacing=0.03, 
-                row_heights=[0.6, 0.15, 0.25],
-                specs=[[{"secondary_y": False}], [{"secondary_y": False}], [{"secondary_y": True}]]
-            )
-
-            if chart_type == "Heikin Ashi":
-                ha = calculate_heikin_ashi(df)
-                fig.add_trace(go.Candlestick(x=df.index, open=ha['Open'], high=ha['High'], low=ha['Low'], close=ha['Close'], name="HA"), row=1, col=1)
-            else:
-                fig.add_trace(go.Candlestick(x=df.index, open=df['Open'], high=df['High'], low=df['Low'], close=df['Close'], name="Price"), row=1, col=1)
-            
-            fig.add_trace(go.Scatter(x=df.index, y=df['Close'].ewm(span=50).mean(), line=dict(color='#2979FF', width=1.5), name="EMA50"), row=1, col=1)
-            fig.add_trace(go.Scatter(x=df.index, y=df['Close'].ewm(span=200).mean(), line=dict(color='#FF9100', width=1.5), name="EMA200"), row=1, col=1)
-
-            colors_vol = ['#00E676' if r.Open < r.Close else '#FF1744' for i, r in df.iterrows()]
-            fig.add_trace(go.Bar(x=df.index, y=df['Volume'], name='Volume', marker_color=colors_vol, showlegend=False), row=2, col=1)
-
-            fig.add_trace(go.Bar(x=df.index, y=macd_hist, name='MACD Hist', marker_color='#00E5FF'), row=3, col=1)
-            fig.add_trace(go.Scatter(x=df.index, y=macd, line=dict(color='#fff', width=1), name='MACD'), row=3, col=1)
-            fig.add_trace(go.Scatter(x=df.index, y=signal_line, line=dict(color='#FFD600', width=1), name='Signal'), row=3, col=1)
-
-            fig.update_layout(
-                template='plotly_dark', 
-                height=700, 
-                margin=dict(l=0,r=0,t=0,b=0), 
-                paper_bgcolor='rgba(0,0,0,0)', 
-                plot_bgcolor='rgba(0,0,0,0)',
-                xaxis_rangeslider_visible=False
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(ana['fig'], use_container_width=True)
 
         with tabs[1]:
             st.markdown(f"""<div style="background:{trend_color_css}20; border:2px solid {trend_color_css}; padding:15px; border-radius:15px; text-align:center; margin-bottom:20px;"><h2 style="margin:0; color:{trend_color_css}; font-size:2rem;">{trend_icon} {trend_status}</h2><p style="margin:5px 0 0 0; color:#ddd;">Market Trend Indicator</p></div>""", unsafe_allow_html=True)
@@ -731,13 +1569,28 @@ if symbol:
                         avg_pe = get_sector_pe_benchmark(sector)
                         diff = ((pe - avg_pe) / avg_pe) * 100
                         status, color, icon = ("Overvalued (แพงกว่ากลุ่ม)", "#FF1744", "🔺") if diff > 15 else ("Undervalued (ถูกกว่ากลุ่ม)", "#00E676", "💎") if diff < -15 else ("Fair Price (ราคาเหมาะสม)", "#FFD600", "⚖️")
-                        st.markdown(f"""<div class='metric-box' style='border-left-color:{color}'><div class='metric-label'>AI Sector Compare (Avg {avg_pe})</div><div class='metric-val' style='color:{color}; font-size:1.6rem;'>{icon} {status}</div><div style='color:#ccc; font-size:0.9rem;'>Difference: {diff:+.1f}%</div></div>""", unsafe_allow_html=True)
+                        st.markdown(f"""<div class='metric-box' style='border-left-color:{color}'><div class='metric-label'>AI Sector Compare (Median {avg_pe:.1f})</div><div class='metric-val' style='color:{color}; font-size:1.6rem;'>{icon} {status}</div><div style='color:#ccc; font-size:0.9rem;'>Difference: {diff:+.1f}%</div></div>""", unsafe_allow_html=True)
+                    pe_live, pe_pct = get_pe_benchmarks().stats_for(sector), get_pe_benchmarks().percentile(sector, pe)
+                    if pe_live and pe_live['n'] >= PE_MIN_SAMPLES: st.caption(f"📊 {sector}: {pe_live['n']} หุ้นในฐานข้อมูล · P25 {pe_live['p25']:.1f} · Median {pe_live['median']:.1f} · P75 {pe_live['p75']:.1f} · {symbol} อยู่ที่ Percentile {pe_pct:.0f}")
+                    else: st.caption("ℹ️ ข้อมูลกลุ่มยังไม่พอ ใช้ค่า P/E อ้างอิงมาตรฐานแทน")
 
         with tabs[2]:
             st.markdown("### 📰 Market Sentiment (Free Source)")
             if news:
                 for n in news: st.markdown(f"""<div class="news-card {n['class']}"><div style="display:flex;justify-content:space-between;margin-bottom:5px;"><div style="display:flex;align-items:center;gap:10px;"><span style="font-size:1rem;">{n['icon']}</span><span style="font-weight:bold;color:#fff;">{n['label']}</span></div><span style="font-size:0.8rem;background:#333;padding:2px 8px;border-radius:5px;">{n['source']}</span></div><h4 style="margin:10px 0;color:#e0e0e0;">{n['title']}</h4><p style="color:#aaa;font-size:0.9rem;line-height:1.5;">{n['summary']}</p><div style="text-align:right;margin-top:10px;"><a href="{n['link']}" target="_blank" style="color:#00E5FF;text-decoration:none;">🔗 อ่านต่อ</a></div></div>""", unsafe_allow_html=True)
             else: st.info("ไม่พบข่าว หรือ Internet มีปัญหา")
+            sent = get_headline_store().sentiment_series(symbol)
+            if len(sent) >= 2:
+                st.markdown("#### 📈 Sentiment History vs Price")
+                px_idx = pd.DatetimeIndex(df.index)
+                px_d = pd.Series(df['Close'].to_numpy(), index=px_idx.tz_convert('UTC') if px_idx.tz is not None else px_idx.tz_localize('UTC'))
+                joined = sent.join(px_d.resample('1D').last().rename('Close'), how='left')
+                fig_sent = make_subplots(specs=[[{"secondary_y": True}]])
+                fig_sent.add_trace(go.Bar(x=joined.index, y=joined['score'], name='Avg Sentiment', marker_color=['#00E676' if v > 0 else '#FF1744' for v in joined['score'].fillna(0)]), secondary_y=False)
+                fig_sent.add_trace(go.Scatter(x=joined.index, y=joined['Close'], name='Close', line=dict(color='#00E5FF', width=1.5), connectgaps=True), secondary_y=True)
+                fig_sent.update_layout(template='plotly_dark', height=350, margin=dict(l=0,r=0,t=0,b=0), paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
+                st.plotly_chart(fig_sent, use_container_width=True)
+                st.caption(f"สะสมข่าวทั้งหมด {int(sent['n'].sum())} ข่าว ตั้งแต่ {sent.index[0]:%Y-%m-%d}")
 
         with tabs[3]:
             if setup:
@@ -764,8 +1617,7 @@ if symbol:
                 is_near = "ใกล้ถึงแล้ว! 🚨" if l_gap < 1.0 else f"อีก {l_gap:.2f}%"
                 st.markdown(f"""<div style="background: linear-gradient(145deg, #1a1a1a, #111); border: 1px solid #333; border-left: 6px solid {lvl['color']}; border-radius: 15px; padding: 20px; margin-bottom: 15px; position: relative; overflow: hidden;"><div style="display:flex; justify-content:space-between; align-items:flex-start;"><div><div style="font-size:1.1rem; font-weight:bold; color:{lvl['color']}; text-transform:uppercase; margin-bottom:5px;">{lvl['name']}</div><div style="font-size:2rem; font-weight:900; color:#fff; line-height:1;">{lvl['price']:,.2f}</div><div style="font-size:0.9rem; color:#888; margin-top:5px;">📉 ระยะห่าง: {is_near}</div></div><div style="text-align:right;"><span style="background:{lvl['color']}20; color:{lvl['color']}; padding:5px 12px; border-radius:20px; font-weight:bold; font-size:0.9rem;">แนะนำ: {lvl['alloc']}</span></div></div><div style="margin-top:15px; padding-top:15px; border-top:1px solid rgba(255,255,255,0.1);"><div style="font-weight:600; color:#eee; font-size:1rem;">{lvl['action']}</div><div style="font-size:0.9rem; color:#aaa;">{lvl['desc']}</div></div><div style="margin-top:10px; background:#333; height:6px; border-radius:3px; width:100%;"><div style="width:{lvl['bar']}%; background:{lvl['color']}; height:100%; border-radius:3px; box-shadow: 0 0 10px {lvl['color']};"></div></div></div>""", unsafe_allow_html=True)
             st.markdown("---")
-            pivots = calculate_pivot_points(df)
-            dynamic = calculate_dynamic_levels(df)
+            pivots, dynamic = ana['pivots'], ana['dynamic']
             if pivots and dynamic:
                 msg, col, icon, act = generate_dynamic_insight(curr, pivots, dynamic)
                 c1, c2 = st.columns(2)
@@ -778,15 +1630,19 @@ if symbol:
                         if k!="Current":
                             dist, cl = ((curr-v)/v)*100, "#00E676" if curr > v else "#FF1744"
                             st.markdown(f"<div class='sr-card' style='border-left:4px solid {cl}; background:rgba({255 if cl=='#FF1744' else 0}, {230 if cl=='#00E676' else 23}, {118 if cl=='#00E676' else 68}, 0.1);'><span>{k}</span><div style='text-align:right;'>{v:,.2f}<br><small style='color:{cl}'>{dist:+.2f}%</small></div></div>", unsafe_allow_html=True)
+            if ana['zones']:
+                st.markdown("---")
+                st.markdown(f"#### 📐 Swing S/R Zones (จุดกลับตัวจริง · ย้อนหลัง {SWING_HISTORY.get(interval, '5y')})")
+                for z in sorted(ana['zones'], key=lambda z: -z['center']):
+                    z_dist = ((z['center'] - curr) / curr) * 100
+                    st.markdown(f"<div class='sr-card {'sr-res' if z['type'] == 'Resistance' else 'sr-sup'}'><div><b>{z['type']}</b> <span style='color:#aaa;'>{z['low']:,.2f} - {z['high']:,.2f}</span><br><small style='color:#888;'>แตะ {z['touches']} ครั้ง · Score {z['score']:.0f}/100</small></div><div style='text-align:right;'>{z['center']:,.2f}<br><small>{z_dist:+.2f}%</small></div></div>", unsafe_allow_html=True)
 
         with tabs[6]:
             st.markdown("### 🧠 AI Guru: Fundamental & Valuation")
             safe_info = info if info else {}
             summary = safe_info.get('longBusinessSummary')
             if summary:
-                if HAS_TRANSLATOR:
-                    try: summary = GoogleTranslator(source='auto', target='th').translate(summary[:2000])
-                    except: pass
+                summary = translate_th(summary[:2000])
                 st.info(f"**🏢 รู้จักกับ {symbol}:** {summary}")
             
             pe = safe_info.get('trailingPE')
@@ -818,11 +1674,11 @@ if symbol:
         with tabs[7]: # [NEW TAB] Financials
             st.markdown("### 💰 Financial Performance (งบการเงินย้อนหลัง)")
             
-            fin_df = get_financial_data_robust(symbol)
+            fin_df = ana['fin_df']
             
             if fin_df is not None:
                 # [NEW FEATURE] AI Financial Health Check
-                f_score, f_reasons, f_verdict, f_color = analyze_financial_health_score(fin_df)
+                f_score, f_reasons, f_verdict, f_color = ana['fin_health']
                 
                 st.markdown(f"""<div class='ai-insight-box' style='border-left: 5px solid {f_color}; margin-bottom:20px;'><h3 style='margin:0; color:{f_color};'>🏥 AI Financial Health Check: {f_score}/10</h3><p style='font-size:1.1rem; font-weight:bold; color:#fff;'>{f_verdict}</p><hr style='border-color:#333;'>{"".join([f"<div style='margin-bottom:5px;'>{r}</div>" for r in f_reasons])}</div>""", unsafe_allow_html=True)
 
@@ -891,7 +1747,12 @@ if symbol:
                     st.warning("⚠️ ไม่พบข้อมูลงบการเงิน (อาจเป็นหุ้นใหม่ ETF หรือข้อมูลยังไม่มา)")
 
         with tabs[8]:
-            bk_sel = st.radio("เลือกเหรียญ (THB)", ["BTC", "ETH"], horizontal=True)
+            bk_table = calculate_bitkub_market_table(bk_data) if bk_data else pd.DataFrame()
+            bk_pairs = bk_table['Pair'].tolist() if not bk_table.empty else ["BTC", "ETH"]
+            bk_sel = st.selectbox("เลือกเหรียญ (THB)", bk_pairs, index=bk_pairs.index("BTC") if "BTC" in bk_pairs else 0)
+            if not bk_table.empty:
+                with st.expander(f"🌐 Market Scan: ทุกคู่เหรียญ THB ({len(bk_table)} pairs)"):
+                    st.dataframe(bk_table.style.format({c: "{:,.2f}" for c in bk_table.columns if c not in ("Pair", "Status", "Bias")}), use_container_width=True, hide_index=True)
             if bk_data:
                 pair = f"THB_{bk_sel}"
                 d = bk_data.get(pair, {})
@@ -921,6 +1782,22 @@ if symbol:
                         st.markdown(f"<div class='sr-card sr-res'><b>R1</b><span>{ai_bk['levels'][1]['price']:,.0f}</span></div>", unsafe_allow_html=True)
                         st.markdown(f"<div class='sr-card sr-sup'><b>S1</b><span>{ai_bk['levels'][3]['price']:,.0f}</span></div>", unsafe_allow_html=True)
                     with st.expander("ℹ️ Bitkub Golden Zone"): st.info(f"**Zone:** {ai_bk['fib']['bot']:,.0f} - {ai_bk['fib']['top']:,.0f}")
+                    st.markdown("---")
+                    st.markdown("#### ⏱️ Intraday Bars (จาก Bitkub Ticker)")
+                    bk_tf = st.radio("Bar Timeframe", list(BAR_TIMEFRAMES), horizontal=True)
+                    bk_df = bk_bars.get_bars(pair, bk_tf)
+                    if len(bk_df) >= 2:
+                        fig_bk = go.Figure(go.Candlestick(x=bk_df.index, open=bk_df['Open'], high=bk_df['High'], low=bk_df['Low'], close=bk_df['Close'], name=pair))
+                        fig_bk.update_layout(template='plotly_dark', height=400, margin=dict(l=0,r=0,t=0,b=0), paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', xaxis_rangeslider_visible=False)
+                        st.plotly_chart(fig_bk, use_container_width=True)
+                        bk_setup = calculate_technical_setup(bk_df) if len(bk_df) >= 15 else None
+                        if bk_setup and not pd.isna(bk_setup['rsi_val']):
+                            c1, c2, c3 = st.columns(3)
+                            c1.markdown(f"<div class='metric-box' style='border-left-color:{bk_setup['color']}'><div class='metric-label'>Signal ({bk_tf})</div><div class='metric-val' style='color:{bk_setup['color']}'>{bk_setup['signal']}</div></div>", unsafe_allow_html=True)
+                            c2.markdown(f"<div class='metric-box'><div class='metric-label'>RSI (14)</div><div class='metric-val'>{bk_setup['rsi_val']:.1f}</div></div>", unsafe_allow_html=True)
+                            c3.markdown(f"<div class='metric-box'><div class='metric-label'>Trend</div><div class='metric-val' style='font-size:1.2rem;'>{bk_setup['trend']}</div></div>", unsafe_allow_html=True)
+                        else: st.caption(f"กำลังสะสมแท่งเทียน ({len(bk_df)} แท่ง) ต้องการอย่างน้อย 15 แท่งสำหรับ Indicator")
+                    else: st.info("⏳ กำลังเก็บข้อมูลแท่งเทียน กรุณารอสักครู่...")
                 else: st.error("ไม่พบข้อมูล")
             else: st.warning("Connecting...")
         
@@ -952,4 +1829,79 @@ if symbol:
                     else: st.error("⚠️ ราคาเข้าซื้อต้องไม่เท่ากับราคา Stop Loss")
                 else: st.error("⚠️ กรุณากรอกราคาให้ถูกต้อง")
 
-    else: st.error("❌ ไม่พบข้อมูลหุ้น/เหรียญนี้")
+            st.markdown("---")
+            st.markdown("### 📂 Portfolio Mode (หลายสถานะพร้อมกัน)")
+            if 'portfolio' not in st.session_state: st.session_state.portfolio = PortfolioRiskEngine()
+            pf = st.session_state.portfolio
+            pc1, pc2, pc3, pc4 = st.columns(4)
+            pf_sym = pc1.text_input("Symbol", symbol, key="pf_sym").upper()
+            pf_entry = pc2.number_input("Entry", value=float(def_entry), key="pf_entry")
+            pf_sl = pc3.number_input("Stop Loss", value=float(def_sl), key="pf_sl")
+            pf_risk = pc4.number_input("Risk %", value=float(risk_pct), step=0.1, key="pf_risk")
+            pb1, pb2 = st.columns(2)
+            if pb1.button("➕ เพิ่มเข้าพอร์ต (Add)", use_container_width=True):
+                pf_df = get_market_data(pf_sym, "2y", "1d")
+                if pf_df.empty: st.error(f"❌ ไม่พบข้อมูล {pf_sym}")
+                else: pf.add(pf_sym, pf_df, pf_entry, pf_sl, pf_risk)
+            if pf.symbols:
+                pf_del = pb2.selectbox("ลบออกจากพอร์ต", pf.symbols, label_visibility="collapsed")
+                if pb2.button("🗑️ ลบ (Remove)", use_container_width=True): pf.remove(pf_del); st.rerun()
+                pf_table, pf_tot = pf.summary(balance)
+                c1, c2, c3, c4 = st.columns(4)
+                c1.markdown(f"<div class='metric-box' style='border-left-color:#FFD600'><div class='metric-label'>Total Cost</div><div class='metric-val'>{pf_tot['cost']:,.0f}</div></div>", unsafe_allow_html=True)
+                c2.markdown(f"<div class='metric-box' style='border-left-color:#FF1744'><div class='metric-label'>Total Stop Risk</div><div class='metric-val'>{pf_tot['risk']:,.0f}</div><div style='color:#888;'>{pf_tot['risk_pct']:.1f}% ของพอร์ต</div></div>", unsafe_allow_html=True)
+                c3.markdown(f"<div class='metric-box' style='border-left-color:#E040FB'><div class='metric-label'>Daily Volatility</div><div class='metric-val'>{pf_tot['vol_pct']:.2f}%</div></div>", unsafe_allow_html=True)
+                c4.markdown(f"<div class='metric-box' style='border-left-color:#00E5FF'><div class='metric-label'>VaR 95% (1 วัน)</div><div class='metric-val'>{pf_tot['var95']:,.0f}</div></div>", unsafe_allow_html=True)
+                st.dataframe(pf_table.style.format({c: "{:,.2f}" for c in pf_table.columns if c not in ("Symbol", "Side")}), use_container_width=True, hide_index=True)
+                if len(pf.symbols) > 1:
+                    pf_corr = pf.corr()
+                    fig_corr = go.Figure(go.Heatmap(z=pf_corr.values, x=pf_corr.columns, y=pf_corr.index, zmin=-1, zmax=1, colorscale='RdYlGn_r'))
+                    fig_corr.update_layout(template='plotly_dark', height=500, margin=dict(l=0,r=0,t=30,b=0), paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', title="Correlation Matrix (Daily Returns)")
+                    st.plotly_chart(fig_corr, use_container_width=True)
+
+        with tabs[10]:
+            st.markdown("### 🔀 Multi-Symbol Comparison (เปรียบเทียบผลตอบแทน)")
+            cmp_on = st.toggle("เปิดการเปรียบเทียบ (ดึงข้อมูลหลายสัญลักษณ์)", key="cmp_on") # every tab renders on each rerun, so stay idle until asked
+            cc1, cc2 = st.columns([3, 1])
+            cmp_raw = cc1.text_input("Symbols (คั่นด้วย ,)", f"{symbol}, SPY, QQQ, BTC-USD", key="cmp_syms")
+            cmp_win = cc2.number_input("Corr Window (bars)", min_value=5, max_value=500, value=30, step=5)
+            cmp_syms = tuple(dict.fromkeys(x.strip().upper() for x in cmp_raw.split(",") if x.strip()))[:COMPARE_MAX]
+            cmp, cmp_missing = build_comparison(cmp_syms, period, interval, int(cmp_win)) if cmp_on else (None, [])
+            if cmp_missing: st.warning("⚠️ ไม่พบข้อมูล: " + ", ".join(cmp_missing))
+            if cmp:
+                st.dataframe(cmp['summary'].style.format({c: "{:,.2f}" for c in cmp['summary'].columns if c != "Symbol"}), use_container_width=True, hide_index=True)
+                for title, key, x in [("Normalized Performance (Base = 100)", 'norm', cmp['index']), (f"Relative Strength vs {cmp['symbols'][0]}", 'rel', cmp['index']), (f"Rolling Correlation vs {cmp['symbols'][0]} ({int(cmp_win)} bars)", 'corr', cmp['corr_index'])]:
+                    if len(cmp[key]) == 0: continue
+                    fig_cmp = go.Figure([go.Scattergl(x=x, y=cmp[key][:, i], name=sym, mode='lines', line=dict(width=1.5)) for i, sym in enumerate(cmp['symbols'])])
+                    fig_cmp.update_layout(template='plotly_dark', height=380, title=title, margin=dict(l=0,r=0,t=40,b=0), paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
+                    st.plotly_chart(fig_cmp, use_container_width=True)
+            elif cmp_on: st.info("ต้องมีอย่างน้อย 2 สัญลักษณ์ที่มีข้อมูลช่วงเวลาเดียวกัน")
+
+    else:
+        st.error("❌ ไม่พบข้อมูลหุ้น/เหรียญนี้")
+        sugg = sym_dir.suggest(symbol[:max(1, len(symbol) - 1)])
+        if sugg: st.info("💡 คุณหมายถึง: " + ", ".join(f"**{s}** ({n})" for s, n in sugg))
+
+with st.sidebar:
+    st.markdown("---")
+    with st.expander("🔥 Cache Warmer"):
+        w_st = warmer.stats()
+        st.markdown(f"**Cache hit ratio:** {w_st['ratio']*100:.0f}% ({w_st['hits']} hit / {w_st['misses']} cold fetch)")
+        st.caption(f"Warm entries: {w_st['keys']} · Top-N: {warmer.top_n}")
+    with st.expander("📦 Bulk Export (หลายหุ้น / ย้อนหลังยาว)"):
+        ex_syms = st.text_area("Symbols (คั่นด้วย , หรือขึ้นบรรทัดใหม่)", symbol, key="ex_syms")
+        ex_interval = st.selectbox("Interval", ["1d", "1wk", "1h"], key="ex_interval")
+        ex_ranges = [p for p in ["1y", "2y", "5y", "10y", "max"] if yahoo_range_ok(p, ex_interval)] # Yahoo serves 1h for 730 days only
+        ex_period = st.selectbox("Range", ex_ranges, index=min(2, len(ex_ranges) - 1), key="ex_period")
+        ex_fmt = st.selectbox("Format", list(EXPORT_FORMATS), key="ex_fmt")
+        if st.button("⚙️ สร้างไฟล์ Export", use_container_width=True):
+            ex_list = list(dict.fromkeys(x.strip().upper() for x in re.split(r"[,\s]+", ex_syms) if x.strip()))
+            ex_bar = st.progress(0.0)
+            ex_path, ex_rows = write_bulk_export(ex_list, ex_period, ex_interval, ex_fmt, lambda f, sym: ex_bar.progress(f, text=sym))
+            if ex_path:
+                # Rendered once, right after the build: the compressed file is handed to Streamlit a single time, then deleted
+                with open(ex_path, 'rb') as f:
+                    st.download_button(f"📥 Download ({ex_rows:,} rows)", data=f, file_name=os.path.basename(ex_path), mime=EXPORT_FORMATS[ex_fmt][1], use_container_width=True)
+                try: os.remove(ex_path)
+                except OSError: pass
+            else: st.error("❌ ไม่พบข้อมูลสำหรับ Export")